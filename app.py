@@ -6,34 +6,100 @@ import pandas as pd
 import joblib
 import numpy as np
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 import warnings
-from sklearn import set_config
 
-# Keep pandas through pipeline (feature-name safety)
-set_config(transform_output="pandas")
-warnings.filterwarnings("ignore")
+# Inference feeds ndarrays through the pipeline; sklearn's default
+# ndarray transform output avoids a DataFrame rebuild at every step.
+# Columns are always in bundle order, so the feature-name check is noise.
+warnings.filterwarnings(
+    "ignore",
+    message="X does not have valid feature names",
+    category=UserWarning,
+)
 
 # ============================================================
 # Load trained pipeline
 # ============================================================
-@st.cache_resource
+@st.cache_resource(show_spinner=False)
 def load_pipeline():
-    return joblib.load("liver_pipeline.joblib")
+    # Bundle is stored uncompressed, so its arrays can be memory-mapped
+    # read-only and paged in on demand instead of copied at load
+    return joblib.load("liver_pipeline.joblib", mmap_mode="r")
 
 bundle = load_pipeline()
 pipeline = bundle["pipeline"]
-feature_names = bundle["feature_names"]
+feature_names = tuple(bundle["feature_names"])
+# Shared column Index, reused instead of rebuilt from the names per frame
+FEATURE_INDEX = pd.Index(feature_names)
+
+# Fitted preprocessing (log1p + scaler) and the raw LightGBM booster,
+# so inference runs on a plain ndarray instead of a one-row DataFrame
+preprocess = pipeline[:-1]
+booster = pipeline[-1].booster_
+
+# ============================================================
+# Cached inference (skips the model on unchanged inputs)
+# ============================================================
+def predict_batch(X, num_threads=0):
+    # One vectorised call for an (n_patients, n_features) array;
+    # num_threads=0 is LightGBM's default (OpenMP picks the thread count)
+    return booster.predict(preprocess.transform(X), num_threads=num_threads)
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def predict_probs(input_values):
+    X = np.fromiter(input_values, dtype=np.float64, count=len(feature_names))
+    # Single row: one thread avoids OpenMP fork/join overhead
+    return predict_batch(X.reshape(1, -1), num_threads=1)[0]
+
+def top_k_desc(a, k):
+    # Indices of the k largest values, largest first: O(n) partition,
+    # then sort only the k survivors
+    k = min(k, a.size)
+    idx = np.argpartition(a, -k)[-k:]
+    return idx[np.argsort(-a[idx])]
 
 # ============================================================
 # Human-readable class labels
 # ============================================================
-CLASS_MAP = {
-    0: "Healthy Liver",
-    1: "Cirrhosis",
-    2: "Hepatitis",
-    3: "Fibrosis",
-    4: "Suspected Liver Disorder"
-}
+# Indexed by model class id (0–4)
+CLASS_NAMES = (
+    "Healthy Liver",
+    "Cirrhosis",
+    "Hepatitis",
+    "Fibrosis",
+    "Suspected Liver Disorder",
+)
+
+# Risk buckets on model confidence: [0, 0.45) Low, [0.45, 0.75) Medium,
+# [0.75, 1] High; np.searchsorted picks the bucket (scalar or batch)
+RISK_BOUNDS = np.array([0.45, 0.75])
+RISK_LEVELS = ("Low", "Medium", "High")
+RISK_COLORS = ("green", "orange", "red")
+
+def assess(input_values):
+    # Cached probabilities plus what the UI derives from them:
+    # top-2 class ids, confidence and risk bucket index
+    probs = predict_probs(input_values)
+    top_idx = top_k_desc(probs, 2)
+    confidence = float(probs[top_idx[0]])
+    bucket = int(np.searchsorted(RISK_BOUNDS, confidence, side="right"))
+    return probs, top_idx, confidence, bucket
+
+# Object arrays so chart labels come from one fancy-index, not a loop
+CLASS_LABELS = np.array(CLASS_NAMES, dtype=object)
+FEATURE_DISPLAY = np.array([f.replace("_", " ") for f in feature_names], dtype=object)
+
+# ============================================================
+# Plotly render config & chart colours
+# ============================================================
+# Figures keep Streamlit's default "streamlit" template: the frontend
+# theme writes fonts, backgrounds and colorway into its layout block.
+# Static charts (no hover/zoom), no modebar
+STATIC_CHART_CONFIG = {"staticPlot": True, "displayModeBar": False}
+
+TOP2_COLORS = ("#0984e3", "#6c5ce7")
+DEVIATION_COLOR = "#d63031"
 
 # ============================================================
 # Medical-grade UI configuration
@@ -52,6 +118,45 @@ FEATURE_UI = {
     "protein": {"label": "Total Protein (g/dL)", "min": 4.0, "max": 9.0, "default": 7.2},
 }
 
+# Resolved per-feature (label, min, max, default), built once at import
+UI_TABLE = {}
+for feature in feature_names:
+    ui = FEATURE_UI.get(feature.lower(), {})
+    UI_TABLE[feature] = (
+        ui.get("label", feature.replace("_", " ").title()),
+        ui.get("min", 0.0),
+        ui.get("max", 1000.0),
+        ui.get("default", 1.0),
+    )
+
+# Input grid layout: (feature position, feature, is-sex flag) per feature
+INPUT_LAYOUT = tuple(
+    (i, feature, feature.lower() in ("sex", "gender"))
+    for i, feature in enumerate(feature_names)
+)
+
+# Uploaded values must be finite and non-negative, and sex exactly 0/1.
+# The form's FEATURE_UI bounds aren't reused here: they are in different
+# units from the training data (e.g. albumin g/dL vs g/L), so they would
+# reject every row of liver_eda_cleaned.csv.
+SEX_MASK = np.array([is_sex for _, _, is_sex in INPUT_LAYOUT])
+
+# ============================================================
+# Warm-up (once per process)
+# ============================================================
+@st.cache_resource(show_spinner=False)
+def warm_up():
+    # Predict the default form once so the first click pays neither
+    # LightGBM's thread-pool init nor a prediction-cache miss
+    defaults = np.array([UI_TABLE[f][3] for f in feature_names], dtype=np.float64)
+    try:
+        predict_probs(tuple(defaults.tolist()))
+    except Exception:
+        # A warm-up failure must never block the app from starting
+        pass
+
+warm_up()
+
 # ============================================================
 # Page config
 # ============================================================
@@ -71,55 +176,179 @@ st.divider()
 # ============================================================
 st.subheader("📋 Patient Clinical Inputs")
 
-input_data = {}
-cols = st.columns(2)
+# Inputs are written straight into a feature-ordered row buffer
+input_row = np.empty(len(feature_names), dtype=np.float64)
 
-for i, feature in enumerate(feature_names):
-    key = feature.lower()
+# Form: widget edits are batched into one rerun on submit
+with st.form("patient_form"):
+    cols = st.columns(2)
 
-    with cols[i % 2]:
+    for i, feature, is_sex in INPUT_LAYOUT:
+        with cols[i & 1]:
 
-        # Sex (human-friendly)
-        if key in ["sex", "gender"]:
-            sex = st.selectbox("Sex", ["Male", "Female"])
-            input_data[feature] = 1 if sex == "Male" else 0
+            # Sex (human-friendly)
+            if is_sex:
+                sex = st.selectbox("Sex", ["Male", "Female"])
+                input_row[i] = 1 if sex == "Male" else 0
 
-        # Numeric features
-        else:
-            ui = FEATURE_UI.get(key, {})
-            input_data[feature] = st.number_input(
-                label=ui.get("label", feature.replace("_", " ").title()),
-                min_value=ui.get("min", 0.0),
-                max_value=ui.get("max", 1000.0),
-                value=ui.get("default", 1.0),
-                help="Enter raw lab value (no transformation needed)"
-            )
+            # Numeric features
+            else:
+                label, lo, hi, default = UI_TABLE[feature]
+                input_row[i] = st.number_input(
+                    label=label,
+                    min_value=lo,
+                    max_value=hi,
+                    value=default,
+                    help="Enter raw lab value (no transformation needed)"
+                )
 
-# Preserve feature order
-input_df = pd.DataFrame([input_data], columns=feature_names)
+    submitted = st.form_submit_button("🔍 Analyze Liver Health")
+
+# Hashable cache key, already in feature order
+input_values = tuple(input_row.tolist())
+
+# ============================================================
+# Chart skeleton (static layout, built once per process)
+# ============================================================
+@st.cache_resource
+def dashboard_skeleton():
+    # Shared across sessions: figures copy this layout, never mutate it
+    grid = make_subplots(
+        rows=2,
+        cols=2,
+        specs=[[{"type": "domain"}, {"type": "xy"}],
+               [{"type": "xy"}, {"type": "xy"}]],
+        subplot_titles=(
+            "Overall Risk Confidence",
+            "Most Likely Conditions",
+            "Overall Feature Profile (Relative Scale)",
+            "Top Influential Feature Deviations",
+        ),
+        vertical_spacing=0.18,
+    )
+    # (1, 2) Top-2 probabilities
+    grid.update_yaxes(range=[0, 1], title_text="Probability", row=1, col=2)
+    # (2, 1) Feature profile
+    grid.add_hline(
+        y=1, line_dash="dash", row=2, col=1, exclude_empty_subplots=False
+    )
+    grid.update_xaxes(title_text="Feature Index", row=2, col=1)
+    grid.update_yaxes(title_text="Relative Magnitude", row=2, col=1)
+    # (2, 2) Feature deviations
+    grid.update_yaxes(title_text="Deviation Strength", row=2, col=2)
+    grid.update_layout(
+        height=750,
+        showlegend=False,
+        uirevision="static",
+        dragmode=False,
+    )
+
+    gauge_domain = grid.get_subplot(1, 1)
+    return {
+        "layout": grid.layout.to_plotly_json(),
+        "gauge_domain": {"x": list(gauge_domain.x), "y": list(gauge_domain.y)},
+    }
+
+# ============================================================
+# Cached figure builder (keyed on the input tuple)
+# ============================================================
+# Cached as a resource: st.plotly_chart re-validates a dict through
+# go.Figure(**dict) on every call, but only serialises a Figure.
+# The cached figures are shared, so they are never mutated after build.
+@st.cache_resource(max_entries=64, show_spinner=False)
+def build_dashboard(input_values):
+    # Everything plotted is a function of the inputs, so they are the key
+    probs, top_idx, confidence, bucket = assess(input_values)
+    risk_color = RISK_COLORS[bucket]
+
+    skeleton = dashboard_skeleton()
+    gauge_domain = skeleton["gauge_domain"]
+
+    values = np.fromiter(input_values, dtype=np.float32, count=len(feature_names))
+    normalized = values * (1.0 / (values.mean() + 1e-6))
+    deviations = np.abs(normalized - 1.0)
+    top_k = top_k_desc(deviations, 5)
+
+    fig = go.Figure(
+        data=[
+            # ---- Chart 1: Risk Gauge (1, 1) ----
+            # Donut (pie with a hole) instead of the heavier Indicator gauge
+            go.Pie(
+                values=[confidence, 1 - confidence],
+                hole=0.7,
+                sort=False,
+                direction="clockwise",
+                marker={"colors": [risk_color, "#dfe6e9"]},
+                textinfo="none",
+                hoverinfo="skip",
+                showlegend=False,
+                domain=gauge_domain,
+            ),
+            # ---- Chart 2: Top-2 Probabilities (1, 2) ----
+            go.Bar(
+                x=CLASS_LABELS[top_idx].tolist(),
+                y=probs[top_idx],
+                marker_color=TOP2_COLORS,
+                hoverinfo="skip",
+                xaxis="x",
+                yaxis="y",
+            ),
+            # ---- Chart 3: Feature Profile (2, 1) ----
+            go.Bar(
+                x=list(range(len(normalized))),
+                y=normalized,
+                hoverinfo="skip",
+                xaxis="x2",
+                yaxis="y2",
+            ),
+            # ---- Chart 4: Top Feature Deviations (2, 2) ----
+            go.Bar(
+                x=FEATURE_DISPLAY[top_k].tolist(),
+                y=deviations[top_k],
+                marker_color=DEVIATION_COLOR,
+                hoverinfo="skip",
+                xaxis="x3",
+                yaxis="y3",
+            ),
+        ],
+        layout=skeleton["layout"],
+    )
+    # Gauge value, centred in the donut
+    fig.add_annotation(
+        text=f"{confidence:.1%}",
+        x=sum(gauge_domain["x"]) / 2,
+        y=sum(gauge_domain["y"]) / 2,
+        xref="paper",
+        yref="paper",
+        showarrow=False,
+        font={"size": 24},
+    )
+    return fig
 
 # ============================================================
 # PREDICTION
 # ============================================================
 st.divider()
 
-if st.button("🔍 Analyze Liver Health"):
+def render_dashboard(input_values):
+    # ========================================================
+    # DASHBOARD (2 × 2 subplots in one figure), rendered once
+    # ========================================================
+    # The key only guards against duplicate element IDs: Streamlit still
+    # derives the element id from the figure spec, so a changed figure
+    # is a new element, not an in-place Plotly.react update
+    st.plotly_chart(
+        build_dashboard(input_values),
+        width="stretch",
+        config=STATIC_CHART_CONFIG,
+        key="dashboard",
+    )
 
-    probs = pipeline.predict_proba(input_df)[0]
-    pred_class = int(np.argmax(probs))
-    confidence = float(probs[pred_class])
-    disease = CLASS_MAP[pred_class]
 
-    # Risk bucket
-    if confidence < 0.45:
-        risk = "Low"
-        risk_color = "green"
-    elif confidence < 0.75:
-        risk = "Medium"
-        risk_color = "orange"
-    else:
-        risk = "High"
-        risk_color = "red"
+def render_analysis(input_values):
+    probs, top_idx, confidence, bucket = assess(input_values)
+    disease = CLASS_NAMES[top_idx[0]]
+    risk = RISK_LEVELS[bucket]
 
     # ========================================================
     # RESULT SUMMARY
@@ -130,85 +359,7 @@ if st.button("🔍 Analyze Liver Health"):
     st.divider()
     st.subheader("📊 Visual Health Analysis")
 
-    # ========================================================
-    # DASHBOARD (2 × 2)
-    # ========================================================
-    col1, col2 = st.columns(2)
-
-    # ---- Chart 1: Risk Gauge ----
-    with col1:
-        fig1 = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=confidence * 100,
-            number={"suffix": "%"},
-            title={"text": "Overall Risk Confidence"},
-            gauge={
-                "axis": {"range": [0, 100]},
-                "bar": {"color": risk_color},
-                "steps": [
-                    {"range": [0, 45], "color": "#b6f2c2"},
-                    {"range": [45, 75], "color": "#ffeaa7"},
-                    {"range": [75, 100], "color": "#fab1a0"},
-                ],
-            },
-        ))
-        st.plotly_chart(fig1, use_container_width=True)
-
-    # ---- Chart 2: Top-2 Probabilities ----
-    with col2:
-        top_idx = np.argsort(probs)[-2:][::-1]
-        fig2 = go.Figure(
-            data=[
-                go.Bar(
-                    x=[CLASS_MAP[i] for i in top_idx],
-                    y=probs[top_idx],
-                    marker_color=["#0984e3", "#6c5ce7"]
-                )
-            ]
-        )
-        fig2.update_layout(
-            title="Most Likely Conditions",
-            yaxis=dict(range=[0, 1], title="Probability"),
-        )
-        st.plotly_chart(fig2, use_container_width=True)
-
-    col3, col4 = st.columns(2)
-
-    # ---- Chart 3: Feature Profile ----
-    with col3:
-        values = np.array([float(input_data[f]) for f in feature_names])
-        normalized = values / (np.mean(values) + 1e-6)
-
-        fig3 = go.Figure(
-            data=[go.Bar(x=list(range(len(normalized))), y=normalized)]
-        )
-        fig3.add_hline(y=1, line_dash="dash")
-        fig3.update_layout(
-            title="Overall Feature Profile (Relative Scale)",
-            xaxis_title="Feature Index",
-            yaxis_title="Relative Magnitude",
-        )
-        st.plotly_chart(fig3, use_container_width=True)
-
-    # ---- Chart 4: Top Feature Deviations ----
-    with col4:
-        deviations = np.abs(normalized - 1.0)
-        top_k = np.argsort(deviations)[-5:][::-1]
-
-        fig4 = go.Figure(
-            data=[
-                go.Bar(
-                    x=[feature_names[i].replace("_", " ") for i in top_k],
-                    y=deviations[top_k],
-                    marker_color="#d63031"
-                )
-            ]
-        )
-        fig4.update_layout(
-            title="Top Influential Feature Deviations",
-            yaxis_title="Deviation Strength",
-        )
-        st.plotly_chart(fig4, use_container_width=True)
+    render_dashboard(input_values)
 
     # ========================================================
     # AI INTERPRETATION
@@ -221,6 +372,121 @@ if st.button("🔍 Analyze Liver Health"):
             "This enables early detection even when individual lab values appear normal."
         )
 
+
+# Remember the last submitted inputs, so other widgets' reruns (e.g. the
+# batch uploader) keep the analysis on screen without re-predicting
+if submitted:
+    st.session_state["analysis_inputs"] = input_values
+
+if "analysis_inputs" in st.session_state:
+    render_analysis(st.session_state["analysis_inputs"])
+
+# ============================================================
+# BATCH ANALYSIS (CSV upload)
+# ============================================================
+st.divider()
+st.subheader("📂 Batch Analysis")
+
+uploaded = st.file_uploader(
+    "Upload patient records (CSV)",
+    type="csv",
+    help="One row per patient with columns: " + ", ".join(feature_names)
+    + " (sex: 1 = Male, 0 = Female)",
+)
+
+def read_batch(uploaded):
+    # Parsed upload, or None after reporting why it can't be used
+    try:
+        batch_df = pd.read_csv(uploaded)
+    except (pd.errors.EmptyDataError, pd.errors.ParserError):
+        st.error("Could not read the file as CSV.")
+        return None
+
+    missing = [f for f in feature_names if f not in batch_df.columns]
+    if missing:
+        st.error(f"Missing columns: {', '.join(missing)}")
+        return None
+    if batch_df.empty:
+        st.error("The file has no patient rows.")
+        return None
+    return batch_df
+
+
+if uploaded is not None:
+    batch_df = read_batch(uploaded)
+
+    if batch_df is not None:
+        # Non-numeric cells become NaN and are flagged with the rest
+        X_batch = (
+            batch_df[FEATURE_INDEX]
+            .apply(pd.to_numeric, errors="coerce")
+            .to_numpy(dtype=np.float64)
+        )
+        patients = pd.Index(
+            [f"Patient {i + 1}" for i in range(len(X_batch))], name="Patient"
+        )
+
+        # isfinite rejects NaN (missing / non-numeric) and ±inf
+        in_range = np.isfinite(X_batch) & (X_batch >= 0)
+        in_range[:, SEX_MASK] &= np.isin(X_batch[:, SEX_MASK], (0, 1))
+        valid = in_range.all(axis=1)
+
+        results = pd.DataFrame({
+            "Diagnosis": None,
+            "Confidence": np.nan,
+            "Risk Level": None,
+            "Skipped (missing / out of range)": [
+                ", ".join(FEATURE_DISPLAY[~row]) for row in in_range
+            ],
+        }, index=patients)
+
+        if not valid.any():
+            st.error("No row has complete, in-range values for every feature.")
+        elif not valid.all():
+            st.warning(
+                f"{int((~valid).sum())} of {len(valid)} rows skipped: "
+                "missing, non-numeric or out-of-range values."
+            )
+
+        if valid.any():
+            probs_batch = predict_batch(X_batch[valid])
+            pred_batch = probs_batch.argmax(axis=1)
+            conf_batch = probs_batch.max(axis=1)
+            risk_batch = np.searchsorted(RISK_BOUNDS, conf_batch, side="right")
+
+            results.loc[valid, "Diagnosis"] = CLASS_LABELS[pred_batch]
+            results.loc[valid, "Confidence"] = conf_batch
+            results.loc[valid, "Risk Level"] = (
+                np.asarray(RISK_LEVELS, dtype=object)[risk_batch]
+            )
+
+        st.dataframe(
+            results,
+            width="stretch",
+            column_config={
+                "Confidence": st.column_config.ProgressColumn(
+                    min_value=0.0, max_value=1.0, format="percent"
+                )
+            },
+        )
+
+        if valid.any():
+            # One heatmap (patients × classes) instead of a chart per patient
+            fig_batch = go.Figure(go.Heatmap(
+                z=probs_batch,
+                x=list(CLASS_NAMES),
+                y=patients[valid].tolist(),
+                zmin=0,
+                zmax=1,
+                colorscale="Blues",
+                colorbar={"title": "Probability"},
+            ))
+            fig_batch.update_layout(
+                title="Class Probabilities per Patient",
+                yaxis=dict(autorange="reversed"),
+            )
+            st.plotly_chart(fig_batch, width="stretch", key="batch_heatmap")
+
 # ============================================================
 # FOOTER
 # ============================================================